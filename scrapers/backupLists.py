@@ -1,92 +1,165 @@
-import requests
+import argparse
+import contextlib
 import json
+import math
 import os
 import asyncio
-import aiohttp
+from collections import deque
 from datetime import date
-from helpers.authenticateSubsplash import authenticateSubsplash
+from helpers import instrumentation
+from helpers.backupStore import BackupStore, blob_suffix
+from helpers.subsplashSession import SUBSPLASH_URL, DEFAULT_CONCURRENCY, create_session, get_json
 
-async def fetch(url, headers):
-  async with aiohttp.ClientSession(headers=headers) as session:
-    async with session.get(url) as response:
-      return response
+LISTS_PAGE_SIZE = 2000
+LIST_ROWS_PAGE_SIZE = 100
+# list-rows pages requested ahead of the one being written, per list
+PAGES_AHEAD = 4
 
 
-async def write_to_file(filename, content):
-  os.makedirs(os.path.dirname(filename), exist_ok=True)
-  with open(filename, 'w') as f:
-    f.write(content)
+def lists_url(page_number):
+  return f'{SUBSPLASH_URL}/builder/v1/lists?filter%5Bapp_key%5D=9XTSHD&filter%5Bgenerated%5D=false&filter%5Btype%5D=standard&page%5Bnumber%5D={page_number}&page%5Bsize%5D={LISTS_PAGE_SIZE}&sort=title'
 
-async def download_and_write(list, headers, backup_folder_path):
+
+def list_rows_url(list_id, page_number):
+  return f"{SUBSPLASH_URL}/builder/v1/list-rows?filter%5Bsource_list%5D={list_id}&page%5Bnumber%5D={page_number}&page%5Bsize%5D={LIST_ROWS_PAGE_SIZE}"
+
+
+def page_count(total, page_size):
+  return max(1, math.ceil(total / page_size))
+
+
+def list_rows_path(folder_path, key):
+  return os.path.join(folder_path, f'list_rows{blob_suffix(key)}')
+
+
+async def list_rows_pages(session, semaphore, list_id, status, first_page):
+  """Yield (status, page) for every list-rows page in order, stopping after a failed first page
+
+  The first page reports the total, so later pages are requested ahead of the writer,
+  but never more than PAGES_AHEAD of them, which keeps memory bounded for huge lists.
+  """
+  yield status, first_page
+  if status != 200:
+    return
+  pending = deque()
+  try:
+    for page_number in range(2, page_count(first_page['total'], LIST_ROWS_PAGE_SIZE) + 1):
+      pending.append(asyncio.create_task(get_json(session, semaphore, list_rows_url(list_id, page_number))))
+      if len(pending) >= PAGES_AHEAD:
+        yield (await pending.popleft())[:2]
+    while pending:
+      yield (await pending.popleft())[:2]
+  finally:
+    for task in pending:
+      task.cancel()
+
+
+def write_to_file(filename, content):
+  with instrumentation.recorder.timer('disk'):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'w') as f:
+      f.write(content)
+
+
+async def download_and_write(session, semaphore, store, list, backup_folder_path, incremental=False):
+  """Back up one list; returns True if its list rows were reused from an earlier snapshot"""
   folder_name = f"{list['title'].strip().replace(' ', '_')}_{list['id']}"
-  file_name = "metadata"
-  file_path = os.path.abspath(os.path.join(backup_folder_path, folder_name, file_name))
+  folder_path = os.path.abspath(os.path.join(backup_folder_path, folder_name))
   # write metadata to file
-  await write_to_file(file_path, json.dumps(list, indent=4))
-  print(f"Wrote metadata to: {folder_name}/{file_name}")
-  
-  # get media items
-  list_item_page_number = 1
+  await asyncio.to_thread(store.write, json.dumps(list, indent=4).encode(), os.path.join(folder_path, "metadata"))
+  print(f"Wrote metadata to: {folder_name}/metadata")
+
+  if incremental:
+    entry = store.unchanged(list)
+    if entry is not None:
+      await asyncio.to_thread(store.link, entry['list_rows'], list_rows_path(folder_path, entry['list_rows']))
+      print(f"Unchanged since last backup, linked list_rows for {list['title']}_{list['id']}")
+      return True
+  previous = store.entry(list['id']) if incremental else None
+  # the ETag only covers page 1, so a 304 vouches for the whole list only when it fits on one page
+  single_page = previous is not None and all(count is not None and count <= LIST_ROWS_PAGE_SIZE for count in (previous['list_rows_count'], list.get('list_rows_count')))
+  conditional_headers = {'If-None-Match': previous['etag']} if single_page and previous['etag'] else None
+
+  print(f"Getting list items for {list['title']}")
+  status, first_page, response_headers = await get_json(session, semaphore, list_rows_url(list['id'], 1), conditional_headers)
+  if status == 304:
+    await asyncio.to_thread(store.link, previous['list_rows'], list_rows_path(folder_path, previous['list_rows']))
+    store.record(list, previous['list_rows'], previous['etag'])
+    print(f"Not modified since last backup, linked list_rows for {list['title']}_{list['id']}")
+    return True
+
+  # each page is compressed onto the blob as soon as it arrives instead of being kept until the end
   count = 0
-  loop = True
-  list_rows = []
-  while (loop):
-    print(f"Getting list items for {list['title']} (page {list_item_page_number}): current count: {count}")
-    url = f"https://core.subsplash.com/builder/v1/list-rows?filter%5Bsource_list%5D={list['id']}&page%5Bnumber%5D={list_item_page_number}&page%5Bsize%5D=100"
-    async with aiohttp.ClientSession(headers=headers) as session:
-      async with session.get(url) as response:
-        if response.status != 200:
-          file_name = "error"
-          file_path = os.path.abspath(os.path.join(backup_folder_path, folder_name, file_name))
-          await write_to_file(file_path, await response.text())
-          loop = False
-          continue
-        list_rows_response = await response.json()
-        count += list_rows_response['count']
-        if (list_item_page_number > 1):
-          print(f"Retrieved {count} of {list_rows_response['total']} list items for {list['title']}_{list['id']}")
-        if (count >= list_rows_response['total'] or count == 0 or list_item_page_number * 100 >= list_rows_response['total']):
-          if (count == 0):
-            print(f"No list items found for {list['title']}_{list['id']}")
-          loop = False
-        list_item_page_number += 1
-        list_rows += list_rows_response['_embedded']['list-rows']
-
-  file_name = "list_rows"
-  file_path = os.path.abspath(os.path.join(backup_folder_path, folder_name, file_name))
-  await write_to_file(file_path, json.dumps(list_rows, indent=4))
-  print(f"Wrote {count} list_rows to: {folder_name}/{file_name}")
-
-
-async def download_and_write_all(backup_folder_path):
+  failed = False
+  with store.open_writer() as writer:
+    async with contextlib.aclosing(list_rows_pages(session, semaphore, list['id'], status, first_page)) as pages:
+      async for page_status, page in pages:
+        if page_status != 200:
+          await asyncio.to_thread(write_to_file, os.path.join(folder_path, "error"), page)
+          failed = True
+          break
+        count += page['count']
+        await asyncio.to_thread(writer.write, page['_embedded']['list-rows'])
+        if page['total'] > LIST_ROWS_PAGE_SIZE:
+          print(f"Retrieved {count} of {page['total']} list items for {list['title']}_{list['id']}")
+    key = await asyncio.to_thread(writer.close)
+  if count == 0:
+    print(f"No list items found for {list['title']}_{list['id']}")
+
+  file_path = list_rows_path(folder_path, key)
+  await asyncio.to_thread(store.link, key, file_path)
+  # a partial backup must not be reused as if it were complete
+  if not failed:
+    store.record(list, key, response_headers.get('ETag'))
+  print(f"Wrote {count} list_rows to: {folder_name}/{os.path.basename(file_path)}")
+  return False
+
+
+async def download_and_write_all(backup_folder_path, store, concurrency=DEFAULT_CONCURRENCY, incremental=False):
   print("Getting lists")
-  page_size = 2000
-  count = 0
-  page_number = 1
-  loop = True
-  while (loop):
-    headers = {
-      'Authorization': f'Bearer {authenticateSubsplash()}'
-    }
-    url = f'https://core.subsplash.com/builder/v1/lists?filter%5Bapp_key%5D=9XTSHD&filter%5Bgenerated%5D=false&filter%5Btype%5D=standard&page%5Bnumber%5D={page_number}&page%5Bsize%5D={page_size}&sort=title'
-    response = requests.request("GET", url, headers=headers).json()
-    count += response['count']
-    print(f"Retrieved {count} of {response['total']} lists")
-    if (count >= response['total'] or count == 0 or page_number * page_size >= response['total']):
-      if (count == 0):
+  # one pooled session and one limit shared by every list and every page
+  semaphore = asyncio.Semaphore(concurrency)
+  # each list in progress holds an open blob writer and up to PAGES_AHEAD pages, so only
+  # `concurrency` lists run at once instead of every list parking after its first page
+  list_slots = asyncio.Semaphore(concurrency)
+
+  async def backup_list(session, list):
+    async with list_slots:
+      return await download_and_write(session, semaphore, store, list, backup_folder_path, incremental)
+
+  try:
+    async with create_session(concurrency=concurrency) as session:
+      _, first_page, _ = await get_json(session, semaphore, lists_url(1))
+      remaining = range(2, page_count(first_page['total'], LISTS_PAGE_SIZE) + 1)
+      responses = [first_page] + [page for _, page, _ in await asyncio.gather(*(get_json(session, semaphore, lists_url(page_number)) for page_number in remaining))]
+
+      count = 0
+      tasks = []
+      for response in responses:
+        count += response['count']
+        print(f"Retrieved {count} of {response['total']} lists")
+        for list in response['_embedded']['lists']:
+          tasks.append(asyncio.create_task(backup_list(session, list)))
+      if count == 0:
         print("No lists found")
-      loop = False
-    tasks = []
-    for list in response['_embedded']['lists']:
-        task = asyncio.create_task(download_and_write(list, headers, backup_folder_path))
-        tasks.append(task)
-    await asyncio.gather(*tasks)
-    page_number += 1
-  print(f"Done backing up {count} lists")
-
-
-backup_folder_path = input('Enter backup folder path: ').strip("'")
-if not os.path.exists(backup_folder_path):
-  raise Exception(f"Backup folder path {backup_folder_path} does not exist. Please make sure the path is correct and try again.")
-backup_folder_path = os.path.join(backup_folder_path, f'data_{date.today()}')
-asyncio.run(download_and_write_all(backup_folder_path))
\ No newline at end of file
+      unchanged = sum(await asyncio.gather(*tasks))
+  finally:
+    await asyncio.to_thread(store.save)
+  print(f"Done backing up {count} lists ({unchanged} unchanged since last backup)")
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Back up every Subsplash list and its list rows')
+  parser.add_argument('backup_folder_path', nargs='?', help='folder to create the data_<date> backup in (prompted for if omitted)')
+  parser.add_argument('--incremental', action='store_true', help='only fetch list rows for lists that changed since the last backup in this folder')
+  parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help=f'maximum requests in flight across all lists and pages, and maximum lists backed up at once (default: {DEFAULT_CONCURRENCY})')
+  instrumentation.add_arguments(parser)
+  args = parser.parse_args()
+
+  backup_folder_path = (args.backup_folder_path or input('Enter backup folder path: ')).strip("'")
+  if not os.path.exists(backup_folder_path):
+    raise Exception(f"Backup folder path {backup_folder_path} does not exist. Please make sure the path is correct and try again.")
+  store = BackupStore(backup_folder_path)
+  backup_folder_path = os.path.join(backup_folder_path, f'data_{date.today()}')
+  with instrumentation.run('backupLists', args.report, args.profile, args.loop_lag):
+    asyncio.run(download_and_write_all(backup_folder_path, store, args.concurrency, args.incremental))
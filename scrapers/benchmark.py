@@ -0,0 +1,114 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from helpers.migrateTags import DEFAULT_RATE
+from helpers.subsplashSession import DEFAULT_CONCURRENCY
+
+# backup-conditional touches every list first, so only ETags can spare a refetch
+SCENARIOS = ['backup', 'backup-incremental', 'backup-conditional', 'tags', 'update-speakers']
+
+
+def peak_rss_mb():
+  # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_scenario(name, work_path, concurrency, rate, results):
+  """Runs in a fresh process so that peak RSS belongs to this scenario alone"""
+  # keep the scrapers' progress lines out of the report
+  sys.stdout = open(os.devnull, 'w')
+  import asyncio
+  from backupLists import download_and_write_all
+  from helpers.backupStore import BackupStore
+  from helpers.getTags import getTags
+  from helpers.migrateTags import migrateTags
+
+  start = time.perf_counter()
+  if name.startswith('backup'):
+    store = BackupStore(work_path)
+    asyncio.run(download_and_write_all(os.path.join(work_path, f'data_{name}'), store, concurrency, name != 'backup'))
+  elif name == 'tags':
+    getTags('speaker', concurrency, os.path.join(work_path, 'subsplashSpeakerTags.json'))
+  elif name == 'update-speakers':
+    renames = [{'tag_id': f'speaker-{i:05d}', 'original': f'Speaker {i:05d}', 'new': 'Speaker 00000'} for i in range(1, 4)]
+    migrateTags(renames, 'speaker', concurrency=concurrency, rate=rate)
+  results.put({'wall_time': time.perf_counter() - start, 'peak_rss_mb': peak_rss_mb()})
+
+
+def get_stats(url):
+  with urllib.request.urlopen(f'{url}/_stats') as response:
+    return json.load(response)
+
+
+def touch_lists(url):
+  with urllib.request.urlopen(urllib.request.Request(f'{url}/_touch', method='POST')):
+    pass
+
+
+def wait_for_port(port, timeout=30):
+  deadline = time.time() + timeout
+  while time.time() < deadline:
+    with socket.socket() as sock:
+      if sock.connect_ex(('127.0.0.1', port)) == 0:
+        return
+    time.sleep(0.1)
+  raise Exception(f"Mock Subsplash did not start listening on port {port}")
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmark the scrapers against a local mock Subsplash server', epilog='Any other arguments (e.g. --lists 1000 --latency 0.05 --throttle-rate 0.05) are passed to helpers/mockSubsplash.py')
+  parser.add_argument('--port', type=int, default=8765)
+  parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+  parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help=f'maximum PATCH requests per second in update-speakers, as in updateSpeakers.py (default: {DEFAULT_RATE})')
+  parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+  parser.add_argument('--output', help='also write the results as JSON to this file')
+  args, mock_args = parser.parse_known_args()
+
+  url = f'http://127.0.0.1:{args.port}'
+  # set before the scenario processes import the helpers, which read it at import time
+  os.environ['SUBSPLASH_URL'] = url
+  os.environ.pop('SUBSPLASH_TOKEN_CACHE', None)
+  server = subprocess.Popen([sys.executable, '-m', 'helpers.mockSubsplash', '--port', str(args.port), *mock_args], cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL)
+  context = multiprocessing.get_context('spawn')
+  report = {'mock': mock_args, 'concurrency': args.concurrency, 'rate': args.rate, 'scenarios': {}}
+  try:
+    wait_for_port(args.port)
+    with tempfile.TemporaryDirectory() as work_path:
+      for name in args.scenarios:
+        if name == 'backup-conditional':
+          touch_lists(url)
+        before = get_stats(url)
+        results = context.Queue()
+        process = context.Process(target=run_scenario, args=(name, work_path, args.concurrency, args.rate, results))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+          raise Exception(f"Scenario {name} failed with exit code {process.exitcode}")
+        result = results.get()
+        after = get_stats(url)
+        requests = after.get('requests', 0) - before.get('requests', 0)
+        result.update({
+          'requests': requests,
+          'requests_per_second': requests / result['wall_time'] if result['wall_time'] else 0,
+          'throttled': after.get('429', 0) - before.get('429', 0),
+          'errors': after.get('500', 0) - before.get('500', 0),
+          'not_modified': after.get('304', 0) - before.get('304', 0),
+        })
+        report['scenarios'][name] = result
+        print(f"{name:<20} {result['wall_time']:8.2f} s {requests:7d} requests {result['requests_per_second']:9.1f} req/s {result['peak_rss_mb']:8.1f} MB peak RSS ({result['throttled']} throttled, {result['errors']} errors, {result['not_modified']} not modified)")
+  finally:
+    server.terminate()
+    server.wait()
+
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2)
+    print(f"Wrote results to: {args.output}")
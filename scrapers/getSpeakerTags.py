@@ -1,3 +1,10 @@
+import argparse
+from helpers import instrumentation
 from helpers.getTags import getTags
 
-getTags('speaker')
+parser = argparse.ArgumentParser(description='Dump every Subsplash speaker tag to data/subsplashSpeakerTags.json')
+instrumentation.add_arguments(parser)
+args = parser.parse_args()
+
+with instrumentation.run('getSpeakerTags', args.report, args.profile, args.loop_lag):
+  getTags('speaker')
@@ -1,3 +1,10 @@
+import argparse
+from helpers import instrumentation
 from helpers.getTags import getTags
 
-getTags('topic')
+parser = argparse.ArgumentParser(description='Dump every Subsplash topic tag to data/subsplashTopicTags.json')
+instrumentation.add_arguments(parser)
+args = parser.parse_args()
+
+with instrumentation.run('getTopicTags', args.report, args.profile, args.loop_lag):
+  getTags('topic')
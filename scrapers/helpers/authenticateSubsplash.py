@@ -1,29 +1,167 @@
-import requests
+import asyncio
+import base64
+import json
 import os
+import random
+import threading
+import time
+import requests
 from dotenv import load_dotenv
+from .instrumentation import recorder
 
-def authenticateSubsplash():
-    dirname = os.path.dirname(__file__)
-    env_file_path = os.path.join(dirname, '../../functions/.env')
-    
-    load_dotenv(env_file_path)
-    """Authenticate to Subsplash API"""
-    # Get the API key
-
-    subsplash_email = os.environ.get('EMAIL')
-    subsplash_password = os.environ.get('PASSWORD')
-    url = "https://core.subsplash.com/accounts/v1/oauth/token?grant_type=password"
-
-    payload={'grant_type': 'password',
-    'scope': 'app:9XTSHD',
-    'email': subsplash_email,
-    'password': subsplash_password}
+dirname = os.path.dirname(__file__)
+load_dotenv(os.path.join(dirname, '../../functions/.env'))
+
+SUBSPLASH_URL = os.environ.get('SUBSPLASH_URL', 'https://core.subsplash.com').rstrip('/')
+# refresh this many seconds before the token actually expires
+REFRESH_MARGIN = 60
+# used when neither `expires_in` nor the JWT says when the token expires
+DEFAULT_TOKEN_LIFETIME = 15 * 60
+# throttling and transient server errors are retried with exponential backoff
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+MAX_BACKOFF = 60
+# seconds before an OAuth request that has not answered is abandoned and retried
+TOKEN_TIMEOUT = 30
+
+
+def backoff(attempt, retry_after=None):
+  try:
+    return min(MAX_BACKOFF, float(retry_after))
+  except (TypeError, ValueError):
+    return min(MAX_BACKOFF, 0.5 * 2 ** attempt) * random.uniform(0.5, 1)
+
+
+def token_expiry(response_json, now):
+  """Epoch seconds at which the access token in an OAuth response expires"""
+  if response_json.get('expires_in'):
+    return now + int(response_json['expires_in'])
+  try:
+    payload = response_json['access_token'].split('.')[1]
+    claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    return int(claims['exp'])
+  except (IndexError, KeyError, TypeError, ValueError):
+    return now + DEFAULT_TOKEN_LIFETIME
+
+
+class SubsplashTokenProvider:
+  """Caches the Subsplash access token and refreshes it shortly before it expires
+
+  The token is kept in process and, when `cache_path` is set, in a file only the
+  current user can read, so consecutive script runs can skip the OAuth round-trip.
+  """
+
+  def __init__(self, cache_path=None):
+    self.cache_path = cache_path
+    self.access_token = None
+    self.expires_at = 0
+    self.lock = threading.Lock()
+    self.refresh_task = None
+
+  def valid(self):
+    return self.access_token is not None and time.time() < self.expires_at - REFRESH_MARGIN
+
+  def token(self):
+    with self.lock:
+      if not self.valid():
+        if not self.load_cache():
+          self.refresh()
+      return self.access_token
+
+  async def token_async(self):
+    """Like token(), but concurrent callers on one event loop share a single refresh"""
+    if self.valid():
+      return self.access_token
+    task = self.refresh_task
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+      task = self.refresh_task = asyncio.ensure_future(asyncio.to_thread(self.token))
+    return await task
+
+  def invalidate(self, access_token):
+    """Forget `access_token` after the API rejected it, unless it was already replaced"""
+    with self.lock:
+      if self.access_token == access_token:
+        self.access_token = None
+        self.expires_at = 0
+      # otherwise load_cache() would hand the rejected token straight back
+      if self.read_cache().get('access_token') == access_token:
+        try:
+          os.remove(self.cache_path)
+        except FileNotFoundError:
+          pass
+
+  def refresh(self):
+    """Authenticate to Subsplash API, retrying 429s, 5xxs and connection errors like request_json"""
+    url = f"{SUBSPLASH_URL}/accounts/v1/oauth/token?grant_type=password"
+    payload = {'grant_type': 'password',
+      'scope': 'app:9XTSHD',
+      'email': os.environ.get('EMAIL'),
+      'password': os.environ.get('PASSWORD')}
     headers = {
       'grant_type': 'password',
       'scope': '9XTSHD'
     }
+    attempt = 0
+    while True:
+      now = time.time()
+      start = time.perf_counter()
+      try:
+        response = requests.request("POST", url, headers=headers, data=payload, timeout=TOKEN_TIMEOUT)
+      except (requests.ConnectionError, requests.Timeout) as e:
+        recorder.record_request('POST', url, type(e).__name__, time.perf_counter() - start)
+        if attempt >= MAX_RETRIES:
+          raise
+        recorder.record_retry('POST', url, type(e).__name__)
+        delay = backoff(attempt)
+      else:
+        recorder.record_request('POST', url, response.status_code, time.perf_counter() - start, len(response.content), len(response.request.body or ''))
+        if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+          break
+        recorder.record_retry('POST', url, response.status_code)
+        delay = backoff(attempt, response.headers.get('Retry-After'))
+      attempt += 1
+      time.sleep(delay)
+    response.raise_for_status()
+    response_json = response.json()
+    self.access_token = response_json['access_token']
+    self.expires_at = token_expiry(response_json, now)
+    self.save_cache()
+
+  def read_cache(self):
+    if not self.cache_path or not os.path.exists(self.cache_path):
+      return {}
+    try:
+      with open(self.cache_path) as f:
+        return json.load(f)
+    except (OSError, ValueError):
+      return {}
+
+  def load_cache(self):
+    cached = self.read_cache()
+    if not cached or cached.get('email') != os.environ.get('EMAIL'):
+      return False
+    self.access_token = cached.get('access_token')
+    self.expires_at = cached.get('expires_at', 0)
+    return self.valid()
+
+  def save_cache(self):
+    if not self.cache_path:
+      return
+    os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+    fd = os.open(self.cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # O_CREAT's mode is ignored for an existing file, so tighten it explicitly
+    os.fchmod(fd, 0o600)
+    with os.fdopen(fd, 'w') as f:
+      json.dump({'email': os.environ.get('EMAIL'), 'access_token': self.access_token, 'expires_at': self.expires_at}, f)
+
+
+token_provider = SubsplashTokenProvider(os.environ.get('SUBSPLASH_TOKEN_CACHE'))
+
+
+def authenticateSubsplash():
+  """Access token for the Subsplash API, only re-authenticating when the cached one is about to expire"""
+  return token_provider.token()
+
 
-    response = requests.request("POST", url, headers=headers, data=payload)
-    access_token = response.json()['access_token']
-    return access_token
-  
+async def authenticateSubsplashAsync():
+  return await token_provider.token_async()
@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from .instrumentation import recorder
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+
+def blob_suffix(key):
+  """File extension carried by a blob key, e.g. '.jsonl.gz' (empty for plain JSON blobs)"""
+  return key[key.index('.'):] if '.' in key else ''
+
+
+class BlobWriter:
+  """Streams records into a compressed JSON Lines blob as they arrive
+
+  Uses zstd when the `zstandard` package is installed and gzip otherwise. The key is
+  the sha256 of the uncompressed lines plus the codec's extension, so the same rows
+  always land in the same blob.
+  """
+
+  def __init__(self, store):
+    self.store = store
+    self.suffix = '.jsonl.zst' if zstandard else '.jsonl.gz'
+    os.makedirs(store.blobs_path, exist_ok=True)
+    fd, self.tmp_path = tempfile.mkstemp(dir=store.blobs_path)
+    self.raw = os.fdopen(fd, 'wb')
+    if zstandard:
+      self.stream = zstandard.ZstdCompressor().stream_writer(self.raw, closefd=False)
+    else:
+      # a fixed mtime and no file name keep the gzip header identical between runs
+      self.stream = gzip.GzipFile(filename='', fileobj=self.raw, mode='wb', mtime=0)
+    self.hash = hashlib.sha256()
+    self.key = None
+
+  def write(self, records):
+    data = ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records).encode()
+    self.hash.update(data)
+    with recorder.timer('disk'):
+      self.stream.write(data)
+
+  def close(self):
+    with recorder.timer('disk'):
+      self.stream.close()
+      self.raw.close()
+      self.key = self.hash.hexdigest() + self.suffix
+      self.store.add(self.tmp_path, self.key)
+    return self.key
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    if self.key is None:
+      self.stream.close()
+      self.raw.close()
+      os.remove(self.tmp_path)
+
+
+class BackupStore:
+  """Content-addressed blob store shared by every snapshot in a backup folder
+
+  Payloads live once in `blobs/<xx>/<sha256>[.jsonl.gz|.jsonl.zst]` and snapshot
+  files are hard links to them, so a list that did not change costs no extra disk
+  space. `manifest.json`
+  remembers each list's last-seen `updated_at`/`list_rows_count`/ETag and the blob
+  holding its list rows.
+  """
+
+  def __init__(self, root):
+    self.blobs_path = os.path.join(root, 'blobs')
+    self.manifest_path = os.path.join(root, 'manifest.json')
+    self.manifest = {}
+    if os.path.exists(self.manifest_path):
+      with open(self.manifest_path) as f:
+        self.manifest = json.load(f)
+
+  def blob_path(self, digest):
+    return os.path.join(self.blobs_path, digest[:2], digest)
+
+  def entry(self, list_id):
+    """Manifest entry for `list_id`, or None if there is none or its blob is gone"""
+    entry = self.manifest.get(list_id)
+    if entry is None or not os.path.exists(self.blob_path(entry['list_rows'])):
+      return None
+    return entry
+
+  def unchanged(self, list):
+    """Manifest entry for `list` if the lists endpoint reports nothing new since it was recorded"""
+    entry = self.entry(list['id'])
+    if entry is None or entry['updated_at'] != list.get('updated_at') or entry['list_rows_count'] != list.get('list_rows_count'):
+      return None
+    return entry
+
+  def add(self, tmp_path, key):
+    """Move a finished temporary file into the store under `key`"""
+    path = self.blob_path(key)
+    if os.path.exists(path):
+      os.remove(tmp_path)
+      return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # blobs are shared between snapshots through hard links, so never edit one in place
+    os.chmod(tmp_path, 0o444)
+    os.replace(tmp_path, path)
+
+  def put(self, content: bytes):
+    digest = hashlib.sha256(content).hexdigest()
+    if not os.path.exists(self.blob_path(digest)):
+      with recorder.timer('disk'):
+        os.makedirs(self.blobs_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.blobs_path)
+        with os.fdopen(fd, 'wb') as f:
+          f.write(content)
+        self.add(tmp_path, digest)
+    return digest
+
+  def open_writer(self):
+    return BlobWriter(self)
+
+  def link(self, digest, filename):
+    with recorder.timer('disk'):
+      os.makedirs(os.path.dirname(filename), exist_ok=True)
+      tmp_path = f'{filename}.tmp'
+      if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+      try:
+        os.link(self.blob_path(digest), tmp_path)
+      except OSError:
+        # e.g. the snapshot is on a different filesystem than the blobs
+        shutil.copyfile(self.blob_path(digest), tmp_path)
+      os.replace(tmp_path, filename)
+
+  def write(self, content: bytes, filename):
+    digest = self.put(content)
+    self.link(digest, filename)
+    return digest
+
+  def record(self, list, list_rows_digest, etag=None):
+    self.manifest[list['id']] = {
+      'updated_at': list.get('updated_at'),
+      'list_rows_count': list.get('list_rows_count'),
+      'etag': etag,
+      'list_rows': list_rows_digest,
+    }
+
+  def save(self):
+    os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+    tmp_path = f'{self.manifest_path}.tmp'
+    with recorder.timer('disk'):
+      with open(tmp_path, 'w') as f:
+        json.dump(self.manifest, f, indent=2)
+      os.replace(tmp_path, self.manifest_path)
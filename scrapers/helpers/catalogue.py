@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sqlite3
+from .readBackup import iter_list_rows, iter_lists
+
+DEFAULT_DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data/catalogue.sqlite'))
+TAG_TYPES = ['speaker', 'topic']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, identity TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS lists (
+  id TEXT PRIMARY KEY,
+  title TEXT NOT NULL,
+  updated_at TEXT,
+  list_rows_count INTEGER,
+  snapshot TEXT NOT NULL,
+  rows_identity TEXT,
+  metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lists_title ON lists (title COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS list_rows (
+  list_id TEXT NOT NULL,
+  position INTEGER NOT NULL,
+  id TEXT,
+  media_item_id TEXT,
+  title TEXT,
+  row TEXT NOT NULL,
+  PRIMARY KEY (list_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS list_rows_media_item ON list_rows (media_item_id);
+CREATE TABLE IF NOT EXISTS tags (
+  id TEXT PRIMARY KEY,
+  type TEXT NOT NULL,
+  name TEXT NOT NULL,
+  sermon_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS tags_name ON tags (type, name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS media_item_tags (
+  media_item_id TEXT NOT NULL,
+  type TEXT NOT NULL,
+  name TEXT NOT NULL,
+  PRIMARY KEY (media_item_id, type, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS media_item_tags_tag ON media_item_tags (type, name COLLATE NOCASE);
+'''
+
+
+def connect(db_path=DEFAULT_DB_PATH):
+  os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+  conn = sqlite3.connect(db_path)
+  conn.row_factory = sqlite3.Row
+  conn.execute('PRAGMA journal_mode=WAL')
+  conn.execute('PRAGMA synchronous=NORMAL')
+  conn.executescript(SCHEMA)
+  return conn
+
+
+def file_identity(file_path):
+  """Changes whenever the file's content may have; hard links to one backup blob share it"""
+  stat = os.stat(file_path)
+  return f'{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def snapshot_identity(snapshot_path):
+  """Changes whenever any file in the snapshot is added, removed or rewritten, e.g. by a same-day backup re-run"""
+  digest = hashlib.sha256()
+  for folder_path, folder_names, file_names in sorted(os.walk(snapshot_path)):
+    for file_name in sorted(file_names):
+      file_path = os.path.join(folder_path, file_name)
+      digest.update(f'{os.path.relpath(file_path, snapshot_path)}\0{file_identity(file_path)}\n'.encode())
+  return digest.hexdigest()
+
+
+def source_unchanged(conn, path, identity):
+  row = conn.execute('SELECT identity FROM sources WHERE path = ?', (path,)).fetchone()
+  return row is not None and row['identity'] == identity
+
+
+def row_media_item(row):
+  return (row.get('_embedded') or {}).get('media-item') or {}
+
+
+def split_tag(tag):
+  type, _, name = tag.partition(':')
+  return (type, name) if name else (None, tag)
+
+
+def index_list(conn, metadata, list_rows_path, snapshot):
+  """Upsert one list; its rows are only replaced if its list_rows file changed since the last index"""
+  identity = file_identity(list_rows_path) if list_rows_path else None
+  previous = conn.execute('SELECT rows_identity FROM lists WHERE id = ?', (metadata['id'],)).fetchone()
+  conn.execute(
+    'INSERT OR REPLACE INTO lists (id, title, updated_at, list_rows_count, snapshot, rows_identity, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)',
+    (metadata['id'], metadata['title'], metadata.get('updated_at'), metadata.get('list_rows_count'), snapshot, identity, json.dumps(metadata)))
+  if list_rows_path is None or (previous is not None and previous['rows_identity'] == identity):
+    return 0
+
+  conn.execute('DELETE FROM list_rows WHERE list_id = ?', (metadata['id'],))
+  rows = []
+  media_item_tags = []
+  for position, row in enumerate(iter_list_rows(list_rows_path)):
+    media_item = row_media_item(row)
+    rows.append((metadata['id'], position, row.get('id'), media_item.get('id'), row.get('title') or media_item.get('title'), json.dumps(row)))
+    if media_item.get('id') and media_item.get('tags') is not None:
+      media_item_tags.append((media_item['id'], [split_tag(tag) for tag in media_item['tags']]))
+  conn.executemany('INSERT INTO list_rows (list_id, position, id, media_item_id, title, row) VALUES (?, ?, ?, ?, ?, ?)', rows)
+  conn.executemany('DELETE FROM media_item_tags WHERE media_item_id = ?', [(id,) for id, _ in media_item_tags])
+  conn.executemany('INSERT OR IGNORE INTO media_item_tags (media_item_id, type, name) VALUES (?, ?, ?)', [(id, type, name) for id, tags in media_item_tags for type, name in tags if type])
+  return len(rows)
+
+
+def index_snapshots(conn, backup_folder_path):
+  """Index every data_<date> snapshot that is new or changed since it was last indexed, oldest first; returns the snapshots indexed"""
+  indexed = []
+  snapshots = sorted(name for name in os.listdir(backup_folder_path) if name.startswith('data_'))
+  for snapshot in snapshots:
+    snapshot_path = os.path.abspath(os.path.join(backup_folder_path, snapshot))
+    identity = snapshot_identity(snapshot_path)
+    if source_unchanged(conn, snapshot_path, identity):
+      continue
+    with conn:
+      row_count = sum(index_list(conn, metadata, list_rows_path, snapshot) for metadata, list_rows_path in iter_lists(snapshot_path))
+      conn.execute('INSERT OR REPLACE INTO sources (path, identity) VALUES (?, ?)', (snapshot_path, identity))
+    print(f"Indexed {snapshot} ({row_count} changed list rows)")
+    indexed.append(snapshot)
+  return indexed
+
+
+def index_tags(conn, type, file_path=None):
+  """Replace the `type` tags with the getTags dump at `file_path` if it changed; returns True if it did"""
+  if file_path is None:
+    file_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data', f'subsplash{type.capitalize()}Tags.json'))
+  if not os.path.exists(file_path):
+    return False
+  identity = file_identity(file_path)
+  if source_unchanged(conn, file_path, identity):
+    return False
+  with open(file_path) as f:
+    tags = json.load(f)
+  with conn:
+    conn.execute('DELETE FROM tags WHERE type = ?', (type,))
+    conn.executemany('INSERT OR REPLACE INTO tags (id, type, name, sermon_count) VALUES (?, ?, ?, ?)', [(tag[f'{type}Id'], type, tag['name'], tag['sermonCount']) for tag in tags])
+    conn.execute('INSERT OR REPLACE INTO sources (path, identity) VALUES (?, ?)', (file_path, identity))
+  print(f"Indexed {len(tags)} {type} tags from: {file_path}")
+  return True
+
+
+def find_tags(conn, type, name):
+  """Tags of `type` whose name matches `name`, ignoring case"""
+  return conn.execute('SELECT * FROM tags WHERE type = ? AND name = ? COLLATE NOCASE', (type, name)).fetchall()
+
+
+def find_list(conn, title):
+  return conn.execute('SELECT * FROM lists WHERE title = ? COLLATE NOCASE', (title,)).fetchone()
+
+
+def sermons_with_tag(conn, type, name):
+  """Distinct media items (with the lists they appear in) carrying the `type:name` tag"""
+  return conn.execute('''
+    SELECT list_rows.media_item_id, list_rows.title, group_concat(DISTINCT lists.title) AS lists
+    FROM media_item_tags
+    JOIN list_rows ON list_rows.media_item_id = media_item_tags.media_item_id
+    JOIN lists ON lists.id = list_rows.list_id
+    WHERE media_item_tags.type = ? AND media_item_tags.name = ? COLLATE NOCASE
+    GROUP BY list_rows.media_item_id
+    ORDER BY list_rows.title''', (type, name)).fetchall()
+
+
+def tags_without_sermons(conn, type):
+  """`type` tags that Subsplash reports no taggings for and that no backed-up media item carries"""
+  return conn.execute('''
+    SELECT * FROM tags
+    WHERE type = ? AND COALESCE(sermon_count, 0) = 0
+      AND NOT EXISTS (SELECT 1 FROM media_item_tags WHERE media_item_tags.type = tags.type AND media_item_tags.name = tags.name COLLATE NOCASE)
+    ORDER BY name''', (type,)).fetchall()
@@ -1,45 +1,74 @@
-import requests
+import asyncio
 import json
+import math
 import os
-from .authenticateSubsplash import authenticateSubsplash
-
-
-def getTags(type: str):
-  types = ['speaker', 'topic']
-  if type not in types:
-    raise ValueError('type must be one of: ' + ', '.join(types))
-  
-  page_number = 1
-  page_size = 100
-  loop = True
-  current = 0
-  headers = {
-    'collection-total': 'include',
-    'Authorization': f'Bearer {authenticateSubsplash()}'
-  }
-  clean_tags = []
-  while loop:
-    url = f"https://core.subsplash.com/tags/v1/tags?filter%5Bapp_key%5D=9XTSHD&filter%5Btype%5D={type}&include=image&page%5Bnumber%5D={page_number}&page%5Bsize%5D={page_size}&sort=title"
-    response = requests.request("GET", url, headers=headers).json()
-    current += response['count']
-    print(f"Retrieved {current} of {response['total']} {type} tags")
-    page_number += 1
-    if current >= response['total']:
-      loop = False
-    raw_tags = response['_embedded']['tags']
-    for tag in raw_tags:
-      filtered_tag = {
-        f'{type}Id': tag['id'],
-        'name': tag['title'],
-        'sermonCount': tag['tagging_count'],
-      }
-      clean_tags.append(filtered_tag)
-      
-  file_name = f'subsplash{type.capitalize()}Tags.json'
-  file_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data', file_name))
-  with open(file_path, 'w') as file:
-    print(f"Wrote results to: {file_path}")
-    file.write(json.dumps(clean_tags, indent=4))
-  
+from .instrumentation import recorder
+from .subsplashSession import SUBSPLASH_URL, DEFAULT_CONCURRENCY, create_session, get_json
+
+TYPES = ['speaker', 'topic']
+PAGE_SIZE = 100
+
+
+def tags_url(type, page_number):
+  return f"{SUBSPLASH_URL}/tags/v1/tags?filter%5Bapp_key%5D=9XTSHD&filter%5Btype%5D={type}&include=image&page%5Bnumber%5D={page_number}&page%5Bsize%5D={PAGE_SIZE}&sort=title"
+
+
+def check_type(type):
+  if type not in TYPES:
+    raise ValueError('type must be one of: ' + ', '.join(TYPES))
+
+
+def check_response(type, status, response):
+  if status != 200:
+    raise Exception(f"Failed to get {type} tags ({status}): {response}")
 
 
+async def iter_tags(type: str, concurrency: int = DEFAULT_CONCURRENCY):
+  """Yield cleaned tags in `sort=title` order while later pages are still downloading
+
+  Page 1 reports the total, so every remaining page is requested right away, with
+  at most `concurrency` requests in flight over one pooled session.
+  """
+  check_type(type)
+  semaphore = asyncio.Semaphore(concurrency)
+  async with create_session({'collection-total': 'include'}, concurrency) as session:
+    status, first_page, _ = await get_json(session, semaphore, tags_url(type, 1))
+    check_response(type, status, first_page)
+    page_total = max(1, math.ceil(first_page['total'] / PAGE_SIZE))
+    tasks = [asyncio.create_task(get_json(session, semaphore, tags_url(type, page_number))) for page_number in range(2, page_total + 1)]
+    try:
+      current = 0
+      for page_number in range(1, page_total + 1):
+        if page_number == 1:
+          response = first_page
+        else:
+          status, response, _ = await tasks[page_number - 2]
+          check_response(type, status, response)
+        current += response['count']
+        print(f"Retrieved {current} of {response['total']} {type} tags")
+        for tag in response['_embedded']['tags']:
+          yield {
+            f'{type}Id': tag['id'],
+            'name': tag['title'],
+            'sermonCount': tag['tagging_count'],
+          }
+    finally:
+      for task in tasks:
+        task.cancel()
+
+
+async def collect_tags(type, concurrency):
+  return [tag async for tag in iter_tags(type, concurrency)]
+
+
+def getTags(type: str, concurrency: int = DEFAULT_CONCURRENCY, file_path=None):
+  check_type(type)
+  clean_tags = asyncio.run(collect_tags(type, concurrency))
+
+  if file_path is None:
+    file_name = f'subsplash{type.capitalize()}Tags.json'
+    file_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data', file_name))
+  with recorder.timer('disk'), open(file_path, 'w') as file:
+    print(f"Wrote results to: {file_path}")
+    file.write(json.dumps(clean_tags, indent=4))
+  return clean_tags
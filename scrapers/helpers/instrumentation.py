@@ -0,0 +1,237 @@
+import asyncio
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+import aiohttp
+from yarl import URL
+
+DEFAULT_REPORT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../reports'))
+# upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+LOOP_LAG_INTERVAL = 0.05
+ID_SEGMENT = re.compile(r'^(?=.*\d)[\w-]{8,}$')
+
+
+def endpoint(method, url):
+  """'GET /builder/v1/list-rows' style key, with ids in the path collapsed to {id}"""
+  path = URL(str(url)).path
+  return f"{method} {'/'.join('{id}' if ID_SEGMENT.match(segment) else segment for segment in path.split('/'))}"
+
+
+def summarize(samples):
+  """Percentiles and histogram for a list of durations in seconds"""
+  if not samples:
+    return {'count': 0}
+  ordered = sorted(sample * 1000 for sample in samples)
+  histogram = Counter()
+  for sample in ordered:
+    histogram[next((f'<={bucket}' for bucket in LATENCY_BUCKETS if sample <= bucket), f'>{LATENCY_BUCKETS[-1]}')] += 1
+  return {
+    'count': len(ordered),
+    'mean': round(sum(ordered) / len(ordered), 2),
+    'p50': round(ordered[len(ordered) // 2], 2),
+    'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+    'p99': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 2),
+    'max': round(ordered[-1], 2),
+    'histogram': dict(histogram),
+  }
+
+
+class Recorder:
+  """Collects per-request and per-phase measurements for one scraper run
+
+  aiohttp sessions report through trace_config(), blocking `requests` calls through
+  record_request(), and disk work through timer('disk'). Everything is guarded by a
+  lock because `requests` and disk writes run in worker threads.
+  """
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    self.started_at = time.time()
+    self.latencies = defaultdict(list)
+    self.statuses = defaultdict(Counter)
+    self.bytes_received = Counter()
+    self.bytes_sent = Counter()
+    self.retries = defaultdict(Counter)
+    self.timers = defaultdict(lambda: {'seconds': 0.0, 'calls': 0})
+    self.in_flight = 0
+    self.max_in_flight = 0
+    self.in_flight_seconds = 0.0
+    self.network_busy_seconds = 0.0
+    self.in_flight_changed_at = time.perf_counter()
+    self.loop_lags = []
+    self.loop_lag_enabled = False
+    self.watched_loops = set()
+
+  def change_in_flight(self, delta):
+    now = time.perf_counter()
+    elapsed = now - self.in_flight_changed_at
+    self.in_flight_seconds += self.in_flight * elapsed
+    if self.in_flight:
+      self.network_busy_seconds += elapsed
+    self.in_flight_changed_at = now
+    self.in_flight += delta
+    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+  def request_started(self):
+    with self.lock:
+      self.change_in_flight(1)
+
+  def request_finished(self, key, status, latency, bytes_received=0, bytes_sent=0):
+    with self.lock:
+      self.change_in_flight(-1)
+      self.latencies[key].append(latency)
+      self.statuses[key][str(status)] += 1
+      self.bytes_received[key] += bytes_received
+      self.bytes_sent[key] += bytes_sent
+
+  def record_request(self, method, url, status, latency, bytes_received=0, bytes_sent=0):
+    """Record a request that was made without an instrumented aiohttp session"""
+    self.request_started()
+    self.request_finished(endpoint(method, url), status, latency, bytes_received, bytes_sent)
+
+  def record_retry(self, method, url, reason):
+    with self.lock:
+      self.retries[endpoint(method, url)][str(reason)] += 1
+
+  @contextlib.contextmanager
+  def timer(self, name):
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      elapsed = time.perf_counter() - start
+      with self.lock:
+        self.timers[name]['seconds'] += elapsed
+        self.timers[name]['calls'] += 1
+
+  def trace_config(self):
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+      context.start = time.perf_counter()
+      context.bytes_sent = 0
+      self.request_started()
+
+    async def on_request_chunk_sent(session, context, params):
+      context.bytes_sent += len(params.chunk)
+
+    async def on_request_end(session, context, params):
+      self.request_finished(endpoint(params.method, params.url), params.response.status, time.perf_counter() - context.start, bytes_sent=context.bytes_sent)
+
+    async def on_request_exception(session, context, params):
+      self.request_finished(endpoint(params.method, params.url), type(params.exception).__name__, time.perf_counter() - context.start, bytes_sent=context.bytes_sent)
+
+    async def on_response_chunk_received(session, context, params):
+      # bodies are read after on_request_end, so their size is added separately
+      with self.lock:
+        self.bytes_received[endpoint(params.method, params.url)] += len(params.chunk)
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    return trace_config
+
+  def watch_loop(self):
+    """Start sampling event loop lag on the running loop, if enabled and not already watching it"""
+    if not self.loop_lag_enabled:
+      return
+    loop = asyncio.get_running_loop()
+    if id(loop) in self.watched_loops:
+      return
+    self.watched_loops.add(id(loop))
+
+    async def sample():
+      while True:
+        start = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        self.loop_lags.append(max(0.0, loop.time() - start - LOOP_LAG_INTERVAL))
+
+    loop.create_task(sample())
+
+  def report(self, name):
+    with self.lock:
+      self.change_in_flight(0)
+      wall_time = time.time() - self.started_at
+      endpoints = {}
+      for key in sorted(set(self.latencies) | set(self.bytes_received) | set(self.retries)):
+        endpoints[key] = {
+          'statuses': dict(self.statuses[key]),
+          'latency_ms': summarize(self.latencies[key]),
+          'bytes_received': self.bytes_received[key],
+          'bytes_sent': self.bytes_sent[key],
+          'retries': dict(self.retries[key]),
+        }
+      report = {
+        'script': name,
+        'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+        'wall_time': round(wall_time, 3),
+        'requests': {
+          'total': sum(len(latencies) for latencies in self.latencies.values()),
+          'retries': sum(sum(retries.values()) for retries in self.retries.values()),
+          'bytes_received': sum(self.bytes_received.values()),
+          'by_endpoint': endpoints,
+        },
+        'concurrency': {
+          'max_in_flight': self.max_in_flight,
+          'mean_in_flight_while_busy': round(self.in_flight_seconds / self.network_busy_seconds, 2) if self.network_busy_seconds else 0,
+        },
+        'time': {
+          'network_busy_seconds': round(self.network_busy_seconds, 3),
+          **{f'{timer}_seconds': round(value['seconds'], 3) for timer, value in self.timers.items()},
+          **{f'{timer}_calls': value['calls'] for timer, value in self.timers.items()},
+        },
+      }
+      if self.loop_lag_enabled:
+        report['event_loop_lag_ms'] = summarize(self.loop_lags)
+      return report
+
+
+recorder = Recorder()
+
+
+def add_arguments(parser):
+  parser.add_argument('--report', help=f'write the run report here (default: a timestamped file in {DEFAULT_REPORT_DIR})')
+  parser.add_argument('--profile', action='store_true', help='run under cProfile and add the hottest functions to the report')
+  parser.add_argument('--loop-lag', action='store_true', help='sample event loop lag and add it to the report')
+
+
+@contextlib.contextmanager
+def run(name, report_path=None, profile=False, loop_lag=False):
+  """Record one scraper run and write its JSON report when it ends, even if it fails"""
+  recorder.reset()
+  recorder.loop_lag_enabled = loop_lag
+  profiler = cProfile.Profile() if profile else None
+  if profiler:
+    profiler.enable()
+  try:
+    yield recorder
+  finally:
+    if profiler:
+      profiler.disable()
+    report = recorder.report(name)
+    if report_path is None:
+      report_path = os.path.join(DEFAULT_REPORT_DIR, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    if profiler:
+      profile_path = f'{os.path.splitext(report_path)[0]}.prof'
+      profiler.dump_stats(profile_path)
+      top = io.StringIO()
+      pstats.Stats(profiler, stream=top).sort_stats('cumulative').print_stats(25)
+      report['profile'] = {'path': profile_path, 'top_cumulative': top.getvalue().splitlines()}
+    with open(report_path, 'w') as f:
+      json.dump(report, f, indent=2)
+    print(f"Wrote run report to: {report_path}")
@@ -0,0 +1,125 @@
+"""Incremental reading and writing of large JSON arrays
+
+Subsplash exports keep their records in one array, either at the top level or
+under a key path such as `_embedded.images`. iter_json_array() yields those
+records one at a time while reading the file in chunks, and write_json_array()
+writes a generator out as it is consumed, so neither side holds the whole export.
+"""
+import json
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = ' \t\n\r'
+# what may follow a complete value; anything else means a number was cut off mid-way
+DELIMITERS = WHITESPACE + ',:]}'
+
+
+class JSONStreamReader:
+  """Buffered cursor over a text file that decodes one JSON value at a time"""
+
+  def __init__(self, f, chunk_size=CHUNK_SIZE):
+    self.f = f
+    self.chunk_size = chunk_size
+    self.buffer = ''
+    self.pos = 0
+    self.eof = False
+    self.decoder = json.JSONDecoder()
+
+  def fill(self, size=None):
+    if self.eof:
+      return False
+    chunk = self.f.read(size or self.chunk_size)
+    if not chunk:
+      self.eof = True
+      return False
+    # drop what has been consumed so the buffer only ever holds the current value
+    self.buffer = self.buffer[self.pos:] + chunk
+    self.pos = 0
+    return True
+
+  def peek(self):
+    """Next non-whitespace character, or '' at the end of the file"""
+    while True:
+      while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+        self.pos += 1
+      if self.pos < len(self.buffer) or not self.fill():
+        return self.buffer[self.pos:self.pos + 1]
+
+  def expect(self, characters):
+    character = self.peek()
+    if not character or character not in characters:
+      raise ValueError(f"Expected one of {characters!r} at offset {self.pos} of the buffer, found {character!r}")
+    self.pos += 1
+    return character
+
+  def value(self):
+    self.peek()
+    size = self.chunk_size
+    while True:
+      try:
+        value, end = self.decoder.raw_decode(self.buffer, self.pos)
+        # a number cut off by the end of the buffer (e.g. '-2.' of '-2.5') still decodes
+        if self.eof or (end < len(self.buffer) and self.buffer[end] in DELIMITERS):
+          self.pos = end
+          return value
+      except json.JSONDecodeError:
+        if self.eof:
+          raise
+      # grow the reads geometrically so a huge value is not re-parsed once per chunk
+      if not self.fill(size):
+        continue
+      size *= 2
+
+
+def find_array(reader, path):
+  """Advance `reader` to just inside the array at `path`; returns False if it is not there"""
+  for key in path:
+    if reader.peek() == '[':
+      # a bare array export, e.g. a saved `_embedded.lists` array
+      break
+    if reader.peek() != '{':
+      return False
+    reader.expect('{')
+    if reader.peek() == '}':
+      return False
+    while True:
+      name = reader.value()
+      reader.expect(':')
+      if name == key:
+        break
+      reader.value()
+      if reader.expect(',}') == '}':
+        return False
+  if reader.peek() != '[':
+    return False
+  reader.expect('[')
+  return True
+
+
+def iter_json_array(f, path=()):
+  """Yield the items of the array at key `path` in the JSON document read from `f`
+
+  The path is skipped if the document itself is an array, and nothing is yielded if
+  the path leads to null or is missing. Values of sibling keys before the array are
+  decoded to be skipped, so only one of them is in memory at a time.
+  """
+  reader = JSONStreamReader(f)
+  if not find_array(reader, path):
+    return
+  if reader.peek() == ']':
+    return
+  while True:
+    yield reader.value()
+    if reader.expect(',]') == ']':
+      return
+
+
+def write_json_array(f, items, indent=2):
+  """Write `items` to `f` as one JSON array, formatted as json.dump(list(items), f, indent=indent) would; returns the count"""
+  count = 0
+  prefix = ' ' * indent
+  for item in items:
+    f.write(',\n' if count else '[\n')
+    f.write('\n'.join(prefix + line for line in json.dumps(item, indent=indent).split('\n')))
+    count += 1
+  f.write('\n]' if count else '[]')
+  return count
@@ -0,0 +1,108 @@
+import asyncio
+import csv
+import json
+import math
+import os
+from .subsplashSession import SUBSPLASH_URL, DEFAULT_CONCURRENCY, RateLimiter, create_session, get_json, request_json
+
+TYPES = ['speaker', 'topic']
+TAGGINGS_PAGE_SIZE = 100
+# PATCH requests per second across all workers
+DEFAULT_RATE = 20
+
+
+def taggings_url(tag_id, page_number):
+  return f"{SUBSPLASH_URL}/tags/v1/taggings?filter%5Bapp_key%5D=9XTSHD&filter%5Btag.id%5D={tag_id}&include=media-item&page%5Bnumber%5D={page_number}&page%5Bsize%5D={TAGGINGS_PAGE_SIZE}"
+
+
+def read_renames(csv_path):
+  """Read rename pairs from a CSV with `original` and `new` columns and an optional `tag_id` column"""
+  with open(csv_path, newline='') as f:
+    return [{'tag_id': row.get('tag_id') or None, 'original': row['original'].strip(), 'new': row['new'].strip()} for row in csv.DictReader(f)]
+
+
+def resolve_tag_ids(renames, type):
+  """Fill in missing tag ids from the data/subsplash<Type>Tags.json dump written by getTags"""
+  if all(rename['tag_id'] for rename in renames):
+    return renames
+  file_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data', f'subsplash{type.capitalize()}Tags.json'))
+  with open(file_path) as f:
+    tag_ids = {tag['name']: tag[f'{type}Id'] for tag in json.load(f)}
+  for rename in renames:
+    if not rename['tag_id']:
+      if rename['original'] not in tag_ids:
+        raise ValueError(f"No {type} tag named {rename['original']!r} in {file_path}; pass its tag id instead")
+      rename['tag_id'] = tag_ids[rename['original']]
+  return renames
+
+
+async def get_taggings_page(session, semaphore, tag_id, page_number):
+  status, page, _ = await get_json(session, semaphore, taggings_url(tag_id, page_number))
+  if status != 200:
+    raise Exception(f"Failed to get taggings page {page_number} for tag {tag_id} ({status}): {page}")
+  return page
+
+
+async def fetch_media_items(session, semaphore, tag_id):
+  """Every (media item id, tags) carrying `tag_id`, across all taggings pages"""
+  pages = [await get_taggings_page(session, semaphore, tag_id, 1)]
+  if pages[0].get('total') is not None:
+    remaining = range(2, math.ceil(pages[0]['total'] / TAGGINGS_PAGE_SIZE) + 1)
+    pages += await asyncio.gather(*(get_taggings_page(session, semaphore, tag_id, page_number) for page_number in remaining))
+  else:
+    # without a total, keep going until a short page
+    while len(pages[-1]['_embedded']['taggings']) == TAGGINGS_PAGE_SIZE:
+      pages.append(await get_taggings_page(session, semaphore, tag_id, len(pages) + 1))
+  return [(tagging['_embedded']['media-item']['id'], tagging['_embedded']['media-item']['tags']) for page in pages for tagging in page['_embedded']['taggings']]
+
+
+def rename_tags(tags, tag_renames):
+  """Apply every rename to `tags`, dropping duplicates created by merging two tags into one"""
+  new_tags = []
+  for tag in tags:
+    tag = tag_renames.get(tag, tag)
+    if tag not in new_tags:
+      new_tags.append(tag)
+  return new_tags
+
+
+async def migrate_tags(renames, type='speaker', dry_run=False, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE):
+  """Rename `type` tags on every media item carrying them; returns a summary dict
+
+  All taggings are collected before the first PATCH: patching moves items out of
+  the tag being paged through, which would otherwise shift later pages and skip
+  items. Each media item is patched once, even when several renames touch it.
+  """
+  if type not in TYPES:
+    raise ValueError('type must be one of: ' + ', '.join(TYPES))
+  renames = resolve_tag_ids(renames, type)
+  tag_renames = {f"{type}:{rename['original']}": f"{type}:{rename['new']}" for rename in renames}
+  semaphore = asyncio.Semaphore(concurrency)
+  limiter = RateLimiter(rate)
+  async with create_session({'collection-total': 'include'}, concurrency) as session:
+    media_items = {}
+    for rename, items in zip(renames, await asyncio.gather(*(fetch_media_items(session, semaphore, rename['tag_id']) for rename in renames))):
+      print(f"Found {len(items)} sermons tagged {type}:{rename['original']}")
+      for id, tags in items:
+        media_items.setdefault(id, tags)
+
+    changes = {id: rename_tags(tags, tag_renames) for id, tags in media_items.items()}
+    changes = {id: new_tags for id, new_tags in changes.items() if new_tags != media_items[id]}
+
+    async def patch(id, new_tags):
+      print(id, new_tags)
+      if dry_run:
+        return id, 200, None
+      status, response, _ = await request_json(session, semaphore, 'PATCH', f"{SUBSPLASH_URL}/media/v1/media-items/{id}", json_body={'tags': new_tags}, limiter=limiter)
+      return id, status, response
+
+    results = await asyncio.gather(*(patch(id, new_tags) for id, new_tags in changes.items()))
+
+  failed = [{'id': id, 'status': status, 'response': response} for id, status, response in results if not 200 <= status < 300]
+  for failure in failed:
+    print(f"Failed to update {failure['id']} ({failure['status']}): {failure['response']}")
+  return {'media_items': len(media_items), 'updated': len(changes) - len(failed), 'failed': failed, 'dry_run': dry_run}
+
+
+def migrateTags(renames, type='speaker', dry_run=False, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE):
+  return asyncio.run(migrate_tags(renames, type, dry_run, concurrency, rate))
@@ -0,0 +1,172 @@
+"""Local stand-in for the parts of core.subsplash.com the scrapers use
+
+Serves a synthetic, deterministic catalogue and can inject latency, 429s and
+5xxs (on the token endpoint only with --fault-token). list-rows pages carry an
+ETag and honour If-None-Match, and POST /_touch bumps every list's updated_at
+without changing its rows. Point the scrapers at it with
+SUBSPLASH_URL=http://127.0.0.1:<port>.
+
+  python -m helpers.mockSubsplash --port 8765 --lists 300 --latency 0.03 --throttle-rate 0.05
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from collections import Counter, defaultdict
+from aiohttp import web
+
+
+class MockSubsplash:
+  def __init__(self, speakers=50, topics=20, media_items=5000, lists=300, rows_per_list=40, latency=0.0, jitter=0.0, throttle_rate=0.0, error_rate=0.0, seed=0, fault_token=False):
+    self.latency = latency
+    self.jitter = jitter
+    self.throttle_rate = throttle_rate
+    self.error_rate = error_rate
+    self.fault_token = fault_token
+    self.touches = 0
+    self.random = random.Random(seed)
+    self.stats = Counter()
+
+    self.tags = {}
+    for type, count in (('speaker', speakers), ('topic', topics)):
+      for i in range(count):
+        id = f'{type}-{i:05d}'
+        self.tags[id] = {'id': id, 'type': type, 'title': f'{type.capitalize()} {i:05d}'}
+    self.media_items = {}
+    self.taggings = defaultdict(set)
+    for i in range(media_items):
+      id = f'media-item-{i:06d}'
+      tags = [f'speaker:Speaker {i % speakers:05d}'] if speakers else []
+      tags += [f'topic:Topic {(i * 7 + j) % topics:05d}' for j in range(2)] if topics else []
+      self.media_items[id] = {'id': id, 'title': f'Sermon {i:06d}', 'tags': tags}
+      for tag in tags:
+        self.taggings[tag].add(id)
+    media_item_ids = sorted(self.media_items)
+    self.lists = []
+    for i in range(lists):
+      size = self.random.randint(0, 2 * rows_per_list)
+      self.lists.append({
+        'id': f'list-{i:05d}',
+        'app_key': '9XTSHD',
+        'type': 'standard',
+        'title': f'List {i:05d}',
+        'updated_at': '2024-01-01T00:00:00Z',
+        'list_rows_count': size,
+        'rows': [media_item_ids[(i * 31 + j) % len(media_item_ids)] for j in range(size)] if media_item_ids else [],
+      })
+    self.lists_by_id = {list['id']: list for list in self.lists}
+
+  def app(self):
+    app = web.Application(middlewares=[self.faults])
+    app.add_routes([
+      web.post('/accounts/v1/oauth/token', self.token),
+      web.get('/tags/v1/tags', self.get_tags),
+      web.get('/tags/v1/taggings', self.get_taggings),
+      web.get('/builder/v1/lists', self.get_lists),
+      web.get('/builder/v1/list-rows', self.get_list_rows),
+      web.patch('/media/v1/media-items/{id}', self.patch_media_item),
+      web.get('/_stats', self.get_stats),
+      web.post('/_touch', self.touch),
+    ])
+    return app
+
+  @web.middleware
+  async def faults(self, request, handler):
+    if request.path.startswith('/_'):
+      return await handler(request)
+    self.stats['requests'] += 1
+    self.stats[f'{request.method} {request.path}'] += 1
+    if self.latency or self.jitter:
+      await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+    if request.path == '/accounts/v1/oauth/token' and not self.fault_token:
+      return await handler(request)
+    roll = self.random.random()
+    if roll < self.throttle_rate:
+      self.stats['429'] += 1
+      return web.json_response({'errors': [{'detail': 'Too Many Requests'}]}, status=429, headers={'Retry-After': '0.05'})
+    if roll < self.throttle_rate + self.error_rate:
+      self.stats['500'] += 1
+      return web.json_response({'errors': [{'detail': 'Internal Server Error'}]}, status=500)
+    return await handler(request)
+
+  def page(self, request, items, key, etag=False):
+    number = int(request.query.get('page[number]', 1))
+    size = int(request.query.get('page[size]', 25))
+    embedded = items[(number - 1) * size:number * size]
+    body = json.dumps({'count': len(embedded), 'total': len(items), '_embedded': {key: embedded}})
+    if not etag:
+      return web.Response(text=body, content_type='application/json')
+    tag = f'"{hashlib.sha1(body.encode()).hexdigest()}"'
+    if request.headers.get('If-None-Match') == tag:
+      self.stats['304'] += 1
+      return web.Response(status=304, headers={'ETag': tag})
+    return web.Response(text=body, content_type='application/json', headers={'ETag': tag})
+
+  async def token(self, request):
+    return web.json_response({'access_token': 'mock-token', 'token_type': 'bearer', 'expires_in': 3600})
+
+  async def get_tags(self, request):
+    type = request.query.get('filter[type]')
+    tags = sorted((tag for tag in self.tags.values() if tag['type'] == type), key=lambda tag: tag['title'])
+    return self.page(request, [{**tag, 'tagging_count': len(self.taggings[f"{tag['type']}:{tag['title']}"])} for tag in tags], 'tags')
+
+  async def get_taggings(self, request):
+    tag = self.tags.get(request.query.get('filter[tag.id]'))
+    if tag is None:
+      return web.json_response({'errors': [{'detail': 'Not Found'}]}, status=404)
+    ids = sorted(self.taggings[f"{tag['type']}:{tag['title']}"])
+    return self.page(request, [{'_embedded': {'media-item': self.media_items[id]}} for id in ids], 'taggings')
+
+  async def get_lists(self, request):
+    return self.page(request, [{key: value for key, value in list.items() if key != 'rows'} for list in self.lists], 'lists')
+
+  async def get_list_rows(self, request):
+    list = self.lists_by_id.get(request.query.get('filter[source_list]'))
+    if list is None:
+      return web.json_response({'errors': [{'detail': 'Not Found'}]}, status=404)
+    rows = [{'id': f"{list['id']}-row-{position}", 'position': position, '_embedded': {'media-item': self.media_items[id]}} for position, id in enumerate(list['rows'])]
+    return self.page(request, rows, 'list-rows', etag=True)
+
+  async def patch_media_item(self, request):
+    media_item = self.media_items.get(request.match_info['id'])
+    if media_item is None:
+      return web.json_response({'errors': [{'detail': 'Not Found'}]}, status=404)
+    tags = (await request.json())['tags']
+    for tag in media_item['tags']:
+      self.taggings[tag].discard(media_item['id'])
+    for tag in tags:
+      self.taggings[tag].add(media_item['id'])
+    media_item['tags'] = tags
+    return web.json_response(media_item)
+
+  async def get_stats(self, request):
+    return web.json_response(dict(self.stats))
+
+  async def touch(self, request):
+    """Mark every list as updated without changing its rows, as editing list metadata would"""
+    self.touches += 1
+    for list in self.lists:
+      list['updated_at'] = f'2024-01-01T00:00:{self.touches % 60:02d}Z'
+    return web.json_response({'lists': len(self.lists)})
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Run a local stand-in for the Subsplash API')
+  parser.add_argument('--port', type=int, default=8765)
+  parser.add_argument('--speakers', type=int, default=50)
+  parser.add_argument('--topics', type=int, default=20)
+  parser.add_argument('--media-items', type=int, default=5000)
+  parser.add_argument('--lists', type=int, default=300)
+  parser.add_argument('--rows-per-list', type=int, default=40, help='average list rows per list')
+  parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+  parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra random seconds per response')
+  parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of requests answered with 429')
+  parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 500')
+  parser.add_argument('--fault-token', action='store_true', help='also inject 429s/500s on the OAuth token endpoint')
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  mock = MockSubsplash(args.speakers, args.topics, args.media_items, args.lists, args.rows_per_list, args.latency, args.jitter, args.throttle_rate, args.error_rate, args.seed, args.fault_token)
+  print(f"Mock Subsplash listening on http://127.0.0.1:{args.port}")
+  web.run_app(mock.app(), host='127.0.0.1', port=args.port, print=None)
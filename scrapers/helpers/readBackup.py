@@ -0,0 +1,63 @@
+import gzip
+import io
+import json
+import os
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+
+def open_list_rows(file_path):
+  """Open a list_rows file from a snapshot as text, decompressing by extension"""
+  if file_path.endswith('.gz'):
+    return gzip.open(file_path, 'rt', encoding='utf-8')
+  if file_path.endswith('.zst'):
+    if zstandard is None:
+      raise ImportError(f'zstandard is required to read {file_path}: pip install zstandard')
+    return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True), encoding='utf-8')
+  return open(file_path)
+
+
+def iter_list_rows(file_path):
+  """Lazily yield every list row stored in `file_path`
+
+  JSON Lines files are read one line at a time. Snapshots taken before the
+  streaming format hold a single indented JSON array, which has to be loaded whole.
+  """
+  with open_list_rows(file_path) as f:
+    if '.jsonl' not in os.path.basename(file_path):
+      yield from json.load(f)
+      return
+    for line in f:
+      if line.strip():
+        yield json.loads(line)
+
+
+def list_rows_file(list_folder_path):
+  for file_name in sorted(os.listdir(list_folder_path)):
+    if file_name.startswith('list_rows') and not file_name.endswith('.tmp'):
+      return os.path.join(list_folder_path, file_name)
+  return None
+
+
+def iter_lists(snapshot_path):
+  """Yield (metadata, list_rows file path or None) for every list in a data_<date> snapshot"""
+  for folder_name in sorted(os.listdir(snapshot_path)):
+    folder_path = os.path.join(snapshot_path, folder_name)
+    metadata_path = os.path.join(folder_path, 'metadata')
+    if not os.path.isfile(metadata_path):
+      continue
+    with open(metadata_path) as f:
+      metadata = json.load(f)
+    yield metadata, list_rows_file(folder_path)
+
+
+def iter_snapshot(snapshot_path):
+  """Yield (list metadata, list row) for every list row in a snapshot, one list at a time"""
+  for metadata, file_path in iter_lists(snapshot_path):
+    if file_path is None:
+      continue
+    for row in iter_list_rows(file_path):
+      yield metadata, row
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import aiohttp
+from .authenticateSubsplash import SUBSPLASH_URL, MAX_RETRIES, RETRY_STATUSES, authenticateSubsplashAsync, backoff, token_provider
+from .instrumentation import recorder
+
+# enough pooled connections to beat one-connection-per-request on a full backup, see benchmark.py
+DEFAULT_CONCURRENCY = 50
+
+
+def create_session(headers=None, concurrency: int = DEFAULT_CONCURRENCY):
+  """Create one keep-alive aiohttp session to share across a whole run
+
+  The connector never opens more than `concurrency` sockets, so requests beyond
+  that wait for a pooled connection instead of starting a new TCP/TLS handshake.
+  Every request made through it is reported to the instrumentation recorder.
+  """
+  recorder.watch_loop()
+  connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency, keepalive_timeout=60, ttl_dns_cache=300)
+  return aiohttp.ClientSession(headers=headers, connector=connector, timeout=aiohttp.ClientTimeout(total=300), trace_configs=[recorder.trace_config()])
+
+
+class RateLimiter:
+  """Spaces requests at least 1/`rate` seconds apart across every coroutine sharing it"""
+
+  def __init__(self, rate=None):
+    self.interval = 1 / rate if rate else 0
+    self.next_time = 0
+
+  async def wait(self):
+    if not self.interval:
+      return
+    now = asyncio.get_running_loop().time()
+    delay = self.next_time - now
+    self.next_time = max(now, self.next_time) + self.interval
+    if delay > 0:
+      await asyncio.sleep(delay)
+
+
+async def request_json(session, semaphore, method, url, headers=None, json_body=None, limiter=None, retries=MAX_RETRIES):
+  """Send a request while holding `semaphore`; returns (status, parsed json or error text, response headers)
+
+  The bearer token comes from the shared token provider, so it is refreshed as it
+  nears expiry, and once more if the API rejects it. 429s, 5xxs and connection
+  errors are retried up to `retries` times with backoff, honouring Retry-After.
+  """
+  attempt = 0
+  refreshed = False
+  while True:
+    access_token = await authenticateSubsplashAsync()
+    request_headers = {**(headers or {}), 'Authorization': f'Bearer {access_token}'}
+    if limiter:
+      await limiter.wait()
+    try:
+      async with semaphore:
+        async with session.request(method, url, headers=request_headers, json=json_body) as response:
+          if response.status == 401 and not refreshed:
+            token_provider.invalidate(access_token)
+            refreshed = True
+            continue
+          if response.status in RETRY_STATUSES and attempt < retries:
+            delay = backoff(attempt, response.headers.get('Retry-After'))
+            recorder.record_retry(method, url, response.status)
+          elif 200 <= response.status < 300:
+            body = await response.read()
+            return response.status, json.loads(body) if body else None, response.headers
+          else:
+            return response.status, await response.text(), response.headers
+    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+      if attempt >= retries:
+        raise
+      delay = backoff(attempt)
+      recorder.record_retry(method, url, type(e).__name__)
+    attempt += 1
+    await asyncio.sleep(delay)
+
+
+async def get_json(session, semaphore, url, headers=None, limiter=None):
+  return await request_json(session, semaphore, 'GET', url, headers=headers, limiter=limiter)
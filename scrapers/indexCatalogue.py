@@ -0,0 +1,23 @@
+import argparse
+from helpers.catalogue import DEFAULT_DB_PATH, TAG_TYPES, connect, index_snapshots, index_tags, sermons_with_tag, tags_without_sermons
+
+parser = argparse.ArgumentParser(description='Index backupLists snapshots and getTags dumps into a local SQLite catalogue')
+parser.add_argument('backup_folder_path', nargs='?', help='folder holding the data_<date> snapshots written by backupLists.py')
+parser.add_argument('--db', default=DEFAULT_DB_PATH, help=f'SQLite database to update (default: {DEFAULT_DB_PATH})')
+parser.add_argument('--speaker', help='after indexing, list the sermons carrying this speaker')
+parser.add_argument('--empty-topics', action='store_true', help='after indexing, list topics with no sermons')
+args = parser.parse_args()
+
+conn = connect(args.db)
+for type in TAG_TYPES:
+  index_tags(conn, type)
+if args.backup_folder_path:
+  index_snapshots(conn, args.backup_folder_path.strip("'"))
+
+if args.speaker:
+  for sermon in sermons_with_tag(conn, 'speaker', args.speaker):
+    print(f"{sermon['media_item_id']}: {sermon['title']} ({sermon['lists']})")
+if args.empty_topics:
+  for topic in tags_without_sermons(conn, 'topic'):
+    print(topic['name'])
+conn.close()
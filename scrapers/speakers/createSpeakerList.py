@@ -1,22 +1,38 @@
+import argparse
+import csv
 import json
-from fuzzywuzzy import fuzz
-speakers = json.load(open('newSpeakersToUpload.json'))
-newlist = sorted(speakers, key=lambda x: x['name'])
-count = 0
-for index, value in enumerate(newlist):
-    name = value['name']
-    found = False
-    for j in range(index, len(newlist)):
-        toCompare = newlist[j]['name']
-        if fuzz.ratio(name, toCompare) > 75 and name != toCompare:
-            if not found:
-                count += 1
-                print(name, end='')
-                found = True
-            print(f": {toCompare}", end='')
-    if found:
-        print()
+import os
+from speakerDedup import DEFAULT_THRESHOLD, cluster, find_matches
 
-# speaker tag: remove dots from everything
-#
-print(count)
+dirname = os.path.dirname(os.path.abspath(__file__))
+parser = argparse.ArgumentParser(description='Find speakers that are probably spelled two different ways')
+parser.add_argument('input', nargs='?', default='newSpeakersToUpload.json', help='JSON list of objects with a "name" key (default: newSpeakersToUpload.json)')
+parser.add_argument('--output', default='speakerClusters.json', help='where to write the clusters (default: speakerClusters.json)')
+parser.add_argument('--merges-csv', help='also write an original,new,tag_id CSV for updateSpeakers.py --csv')
+parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help=f'minimum fuzz.ratio of the normalized names (default: {DEFAULT_THRESHOLD})')
+parser.add_argument('--workers', type=int, default=1, help='score in this many processes (default: 1)')
+args = parser.parse_args()
+
+with open(args.input) as f:
+  names = sorted({speaker['name'] for speaker in json.load(f)})
+with open(os.path.join(dirname, '../data/subsplashSpeakerTags.json')) as f:
+  speaker_tags = {tag['name']: tag for tag in json.load(f)}
+
+matches = find_matches(names, args.threshold, args.workers)
+clusters = cluster(names, matches, {name: tag['sermonCount'] for name, tag in speaker_tags.items()})
+for speaker_cluster in clusters:
+  print(f"{speaker_cluster['canonical']}: {', '.join(name for name in speaker_cluster['names'] if name != speaker_cluster['canonical'])}")
+
+with open(args.output, 'w') as f:
+  json.dump(clusters, f, indent=2)
+print(f"Wrote {len(clusters)} clusters covering {sum(len(c['names']) for c in clusters)} of {len(names)} speakers to: {args.output}")
+
+if args.merges_csv:
+  with open(args.merges_csv, 'w', newline='') as f:
+    writer = csv.writer(f)
+    writer.writerow(['original', 'new', 'tag_id'])
+    for speaker_cluster in clusters:
+      for name in speaker_cluster['names']:
+        if name != speaker_cluster['canonical']:
+          writer.writerow([name, speaker_cluster['canonical'], speaker_tags.get(name, {}).get('speakerId', '')])
+  print(f"Wrote merges to review to: {args.merges_csv}")
@@ -0,0 +1,122 @@
+import re
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from rapidfuzz import fuzz
+from rapidfuzz.process import cpdist
+
+# honorifics that differ between spellings of the same speaker, longest first
+TITLES = [('hh', 'pope'), ('hg', 'bishop'), ('he', 'metropolitan'), ('sub', 'dcn'), ('metropolitan',), ('archdeacon',), ('deacon',), ('dcn',), ('fr',), ('dr',), ('professor',), ('prof',), ('sister',)]
+DEFAULT_THRESHOLD = 85
+NGRAM_SIZE = 3
+# a pair is only scored if this share of the shorter name's n-grams also occur in the other
+MIN_SHARED_NGRAMS = 0.3
+# n-grams found in more names than this are too common to narrow anything down
+MAX_NGRAM_FREQUENCY = 200
+CHUNK_SIZE = 500
+
+
+def normalize(name):
+  """Lowercase, turn punctuation into spaces and drop leading titles
+
+  Titles are kept when dropping them would leave a single word, so that
+  "HG Bishop Daniel" and "Fr Daniel" stay apart.
+  """
+  tokens = re.sub(r'[^\w\s]|_', ' ', name.lower()).split()
+  stripped = tokens
+  while True:
+    title = next((title for title in TITLES if tuple(stripped[:len(title)]) == title), None)
+    if title is None:
+      break
+    stripped = stripped[len(title):]
+  return ' '.join(stripped if len(stripped) > 1 else tokens)
+
+
+def ngrams(text):
+  padded = f' {text} '
+  return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+def build_index(normalized):
+  """N-gram sets per name plus an inverted index from n-gram to the ids of the names containing it"""
+  grams = [ngrams(text) for text in normalized]
+  index = defaultdict(list)
+  for id, name_grams in enumerate(grams):
+    for gram in name_grams:
+      index[gram].append(id)
+  return grams, {gram: ids for gram, ids in index.items() if len(ids) <= MAX_NGRAM_FREQUENCY}
+
+
+def candidates(id, grams, index):
+  """Ids after `id` sharing enough n-grams with it to be worth scoring"""
+  shared = Counter()
+  for gram in grams[id]:
+    ids = index.get(gram, ())
+    # postings are sorted, so skip straight past the ids already compared
+    shared.update(ids[bisect_right(ids, id):])
+  size = len(grams[id])
+  return [other for other, count in shared.items() if count >= MIN_SHARED_NGRAMS * min(size, len(grams[other]))]
+
+
+def score_chunk(ids, normalized, grams, index, threshold):
+  """Score every candidate pair for `ids` in one vectorized call; returns (id, other, score) above threshold"""
+  pairs = [(id, other) for id in ids for other in candidates(id, grams, index)]
+  if not pairs:
+    return []
+  scores = cpdist([normalized[id] for id, _ in pairs], [normalized[other] for _, other in pairs], scorer=fuzz.ratio)
+  return [(id, other, float(score)) for (id, other), score in zip(pairs, scores) if score >= threshold]
+
+
+worker_state = {}
+
+
+def init_worker(normalized, grams, index, threshold):
+  worker_state.update(normalized=normalized, grams=grams, index=index, threshold=threshold)
+
+
+def score_chunk_in_worker(ids):
+  return score_chunk(ids, worker_state['normalized'], worker_state['grams'], worker_state['index'], worker_state['threshold'])
+
+
+def find_matches(names, threshold=DEFAULT_THRESHOLD, workers=1):
+  """Every (i, j, score) with i < j whose normalized names score at least `threshold`"""
+  normalized = [normalize(name) for name in names]
+  grams, index = build_index(normalized)
+  chunks = [range(start, min(start + CHUNK_SIZE, len(names))) for start in range(0, len(names), CHUNK_SIZE)]
+  if workers > 1 and len(chunks) > 1:
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(normalized, grams, index, threshold)) as executor:
+      return [match for matches in executor.map(score_chunk_in_worker, chunks) for match in matches]
+  return [match for chunk in chunks for match in score_chunk(chunk, normalized, grams, index, threshold)]
+
+
+def cluster(names, matches, sermon_counts=None):
+  """Group matched names into connected components
+
+  The canonical name of a cluster is the one with the most sermons, then the longest.
+  """
+  parents = list(range(len(names)))
+
+  def find(id):
+    while parents[id] != id:
+      parents[id] = parents[parents[id]]
+      id = parents[id]
+    return id
+
+  for id, other, _ in matches:
+    parents[find(id)] = find(other)
+  components = defaultdict(list)
+  for id, _ in enumerate(names):
+    components[find(id)].append(id)
+  scores = defaultdict(list)
+  for id, other, score in matches:
+    scores[find(id)].append([names[id], names[other], round(score, 1)])
+
+  sermon_counts = sermon_counts or {}
+  clusters = []
+  for root, ids in components.items():
+    if len(ids) < 2:
+      continue
+    cluster_names = sorted(names[id] for id in ids)
+    canonical = max(cluster_names, key=lambda name: (sermon_counts.get(name, 0), len(name)))
+    clusters.append({'canonical': canonical, 'names': cluster_names, 'matches': scores[root]})
+  return sorted(clusters, key=lambda cluster: cluster['canonical'])
@@ -0,0 +1,67 @@
+import re
+from collections import defaultdict
+
+
+def normalize_title(title):
+  return title.lower().replace('.', '')
+
+
+def tokens(text):
+  return re.findall(r'\w+', text.lower())
+
+
+def is_square(image):
+  return image.get('title') is not None and image.get('width') is not None and image.get('height') is not None and image['width'] == image['height']
+
+
+class SpeakerMatcher:
+  """Resolves speaker names to their Subsplash list and square image
+
+  Both lookups are indexed once up front: lists by normalized title, and square
+  images through a word -> image positions inverted index, so each speaker only
+  looks at images containing every word of their name.
+  """
+
+  def __init__(self, images=(), lists=()):
+    self.lists = {}
+    for speaker_list in lists:
+      # the first list with a given title wins, as in a linear scan
+      self.lists.setdefault(normalize_title(speaker_list['title']), speaker_list)
+    self.images = []
+    self.image_tokens = []
+    self.index = defaultdict(list)
+    for image in images:
+      self.add_image(image)
+
+  def add_image(self, image):
+    if not is_square(image):
+      return
+    position = len(self.images)
+    title = image['title'].lower()
+    self.images.append((title, image))
+    self.image_tokens.append(set(tokens(title)))
+    for token in self.image_tokens[position]:
+      self.index[token].append(position)
+
+  def match_list(self, name):
+    return self.lists.get(normalize_title(name))
+
+  def match_image(self, name):
+    """First square image whose title contains the speaker's name, with or without dots
+
+    Only whole-word matches count, so "Fr K" no longer picks up "Fr Kyrillos". Each
+    variant is checked against its own words, so "Fr S.Mathai" still matches a title
+    containing "fr smathai".
+    """
+    best = None
+    for variant in {normalize_title(name), name.lower()}:
+      variant_tokens = set(tokens(variant))
+      if not variant_tokens:
+        continue
+      for position in min((self.index.get(token, []) for token in variant_tokens), key=len):
+        if best is not None and position >= best:
+          break
+        if variant_tokens <= self.image_tokens[position] and variant in self.images[position][0]:
+          best = position
+          break
+    return None if best is None else self.images[best][1]
@@ -1,26 +1,31 @@
-import json
+import argparse
+import os
+import sys
 
-f = open('topics.json')
-data = json.load(f)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from helpers.jsonStream import iter_json_array, write_json_array
 
-topics = ['Faith', 'Church', 'Prayer', 'Eternal Life', 'Relationship', 'Joy', 'Lent', 'Salvation', 'Holy Spirit', 'Repentance', 'Resurrection', 'Sacraments', 'Hope', 'Service', 'Unity', 'Peace', 'Purpose', 'Parable', 'St Mary', 'Healing', 'Trust', 'Humility', 'Fear', 'Miracle', 'Forgiveness', 'Grace', 'Liturgy', 'Temptation', 'Tribulation', 'Following Christ', 'Comfort', 'Sacrifice', 'Marriage', 'Wisdom', 'Obedience', 'Fasting', 'Mercy', 'Blessings', 'Evangelism', 'Pentecost', "God's Will", 'Doubt', 'Second Coming', 'Nativity', 'Desire For God', 'Confession', 'Loneliness', 'Creation', 'Identity', 'Spiritual Warfare', 'Purity',
-          'Transformation', 'Judgement', 'Renewal', 'Discipleship', 'Covenant', 'Friendship', 'The Christian Life', 'Patience', 'Pride', 'Orthodoxy', 'Anger', "God's Promise", "God's Love", 'Fellowship', 'Trinity', 'Commitment', 'Mental Health', 'Jesus Christ', 'Love', 'Martyrdom', 'Anxiety', 'The Bible', 'Thankfulness', 'Sin', 'Gentleness', 'Social Media', 'Gospel', 'Suffering', 'Childhood', 'Politics', 'Lukewarmness', 'Gossip', 'Asceticism', 'Holiness', 'Holy Week', 'Homosexuality', 'Virtues', 'Kingdom of God', 'Christmas', 'Racism', 'Envy', 'Jesus', 'Discipline', 'Community', 'Death', 'Parables', 'Sovereignty of God', 'Apologetics', 'Humanity']
+dirname = os.path.dirname(os.path.abspath(__file__))
 
-topics_objects = []
 
-with open('topicsToAdd.json', 'w') as f:
-    d = []
-    for i in data:
-        print(i['title'])
-        images = None if i.get('_embedded') == None else i['_embedded']['images']
-        image_dict = []
-        if images != None:
-            for image in images:
-                image_dict.append({'title': i['title'], 'id': i['id'], 'type': image['type'], 'downloadLink': image['_links']
-                                ['download']['href'], 'height': image['height'], 'width': image['width']})
-        d.append({'listId': i['id'], 'name': i['title'], 'images': 'null' if images == None else image_dict})
+def topic_to_add(i):
+  print(i['title'])
+  images = None if i.get('_embedded') == None else i['_embedded']['images']
+  image_dict = []
+  if images != None:
+    for image in images:
+      image_dict.append({'title': i['title'], 'id': i['id'], 'type': image['type'], 'downloadLink': image['_links']
+                        ['download']['href'], 'height': image['height'], 'width': image['width']})
+  return {'listId': i['id'], 'name': i['title'], 'images': 'null' if images == None else image_dict}
 
-    json.dump(d, f, indent=2)
 
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Turn a Subsplash topic lists export into the topics to add')
+  parser.add_argument('input', nargs='?', default=os.path.join(dirname, 'topics.json'), help='Subsplash lists export, as a bare array or with `_embedded.lists` (default: topics.json next to this script)')
+  parser.add_argument('output', nargs='?', default=os.path.join(dirname, 'topicsToAdd.json'), help='where to write the topics (default: topicsToAdd.json next to this script)')
+  args = parser.parse_args()
 
-f.close()
+  # one topic is read, converted and written at a time
+  with open(args.input) as f, open(args.output, 'w') as out:
+    count = write_json_array(out, (topic_to_add(i) for i in iter_json_array(f, ('_embedded', 'lists'))))
+  print(f"Wrote {count} topics to: {args.output}")
@@ -1,23 +1,24 @@
-from helpers.authenticateSubsplash import authenticateSubsplash
-import requests
-import json
-token = authenticateSubsplash()
-speaker_id = input('Enter speaker ID: ')
-original_speaker = input('Enter original speaker name: ')
-new_speaker = input('Enter new speaker name: ')
-headers = {
-  'Authorization': f'Bearer {authenticateSubsplash()}'
-}
-url = f"https://core.subsplash.com/tags/v1/taggings?filter%5Bapp_key%5D=9XTSHD&filter%5Btag.id%5D={speaker_id}&include=media-item&page%5Bnumber%5D=1&page%5Bsize%5D=100"
-response = requests.request("GET", url, headers=headers).json()
-ids_and_tags = [(tagging['_embedded']['media-item']['id'], tagging['_embedded']['media-item']['tags']) for tagging in response['_embedded']['taggings']]
+import argparse
+from helpers import instrumentation
+from helpers.migrateTags import DEFAULT_RATE, migrateTags, read_renames
+from helpers.subsplashSession import DEFAULT_CONCURRENCY
 
-for id, tags in ids_and_tags:
-  new_tags =  [f'speaker:{new_speaker}' if tag == f'speaker:{original_speaker}' else tag for tag in tags]
-  payload = json.dumps({
-    "tags": new_tags
-  })
-  print(id, new_tags)
-  response = requests.request("PATCH", f"https://core.subsplash.com/media/v1/media-items/{id}", headers=headers, data=payload)
+parser = argparse.ArgumentParser(description='Rename speaker tags on every sermon that carries them')
+parser.add_argument('--csv', help='CSV of renames with original,new[,tag_id] columns (prompted for a single rename if omitted)')
+parser.add_argument('--dry-run', action='store_true', help='print the changes without patching anything')
+parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help=f'maximum requests in flight (default: {DEFAULT_CONCURRENCY})')
+parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help=f'maximum PATCH requests per second (default: {DEFAULT_RATE})')
+instrumentation.add_arguments(parser)
+args = parser.parse_args()
 
-print(f'Done migrating {len(ids_and_tags)} sermons')
\ No newline at end of file
+if args.csv:
+  renames = read_renames(args.csv)
+else:
+  speaker_id = input('Enter speaker ID: ')
+  original_speaker = input('Enter original speaker name: ')
+  new_speaker = input('Enter new speaker name: ')
+  renames = [{'tag_id': speaker_id or None, 'original': original_speaker, 'new': new_speaker}]
+
+with instrumentation.run('updateSpeakers', args.report, args.profile, args.loop_lag):
+  summary = migrateTags(renames, 'speaker', args.dry_run, args.concurrency, args.rate)
+print(f"{'Would migrate' if args.dry_run else 'Done migrating'} {summary['updated']} of {summary['media_items']} sermons ({len(summary['failed'])} failed)")